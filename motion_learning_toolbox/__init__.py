@@ -4,3 +4,4 @@ from .to_body_relative import to_body_relative
 from .fix_controller_mapping import fix_controller_mapping
 from .to_acceleration import to_acceleration
 from .canonicalize_quaternions import canonicalize_quaternions
+from .process_corpus import process_corpus, process_corpus_locally, aggregate_reports, shard_recordings, read_manifest
@@ -1,7 +1,33 @@
 from typing import List
 import numpy as np
 import pandas as pd
-import quaternionic
+
+
+def canonicalize_quaternion_array(quaternions: np.ndarray) -> np.ndarray:
+    """
+    Canonicalizes an array of quaternions in place, see `canonicalize_quaternions`.
+
+    Sign flip and normalization are fused into a single scaling of each quaternion, so the array is only written once; it may also be
+    a non-contiguous view, e.g., the rotation columns of a larger block. If the w-component is 0, the sign of the first non-zero
+    component of x, y and z is used instead. Quaternions with any NaN component (or a norm of 0) become NaN entirely.
+
+    :param quaternions: floating point array of shape (..., 4) with quaternions in "wxyz" order along the last axis.
+    :return: the same array, with non-negative w-components and normalized quaternions.
+    """
+    signs = np.sign(quaternions[..., 0])
+
+    undecided = signs == 0
+    for component in range(1, 4):
+        if not undecided.any():
+            break
+        signs[undecided] = np.sign(quaternions[..., component][undecided])
+        undecided = signs == 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        signs /= np.sqrt(np.einsum("...i,...i->...", quaternions, quaternions))
+
+    quaternions *= signs[..., None]
+    return quaternions
 
 
 def canonicalize_quaternions(data: pd.DataFrame, joint_names: List[str], inplace=False) -> pd.DataFrame:
@@ -9,7 +35,7 @@ def canonicalize_quaternions(data: pd.DataFrame, joint_names: List[str], inplace
     Canonicalize the quaternions in the DataFrame for a given list of joint names.
     
     The function modifies the quaternion rotation data to follow a canonical form. 
-    Specifically, it ensures that the w-component of the quaternion is non-negative and that the returned quaternion is normalized.
+    Specifically, it ensures that the w-component of the quaternion is non-negative (or, if w is 0, the first non-zero component of x, y and z) and that the returned quaternion is normalized.
     This provides a unique representation for each rotation, which is useful for machine learning applications.
     
     Parameters:
@@ -31,9 +57,9 @@ def canonicalize_quaternions(data: pd.DataFrame, joint_names: List[str], inplace
     if not inplace:
         data = data.copy()
 
-    for joint in joint_names:
-        rotation_column_names = [f"{joint}_rot_{xyzw}" for xyzw in "wxyz"]
-        canonicalized_quaternion = data[rotation_column_names].to_numpy() * np.sign(data[rotation_column_names[0]]).to_numpy()[:, None]
-        data[rotation_column_names] = quaternionic.array(canonicalized_quaternion).normalized.ndarray
+    rotation_column_names = [f"{joint}_rot_{xyzw}" for joint in joint_names for xyzw in "wxyz"]
+    rotation_dtype = np.result_type(*data[rotation_column_names].dtypes, np.float32)
+    quaternions = data[rotation_column_names].to_numpy(dtype=rotation_dtype).reshape(len(data), len(joint_names), 4)
+    data[rotation_column_names] = canonicalize_quaternion_array(quaternions).reshape(len(data), -1)
 
     return data
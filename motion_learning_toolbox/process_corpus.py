@@ -0,0 +1,293 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+from importlib import metadata
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+CHECKPOINT_DIRECTORY = "_checkpoints"
+REPORT_DIRECTORY = "_reports"
+
+
+def read_manifest(manifest_path: Union[str, Path]) -> List[str]:
+    """
+    Reads the list of recordings from a manifest file.
+
+    :param manifest_path: path to a text file with one recording per line, given as path relative to the directory of the manifest. Empty lines and lines starting with "#" are ignored.
+
+    :return: A list with the relative paths of the recordings, as written in the manifest.
+    """
+    lines = [line.strip() for line in Path(manifest_path).read_text().splitlines()]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def shard_recordings(recordings: List[str], num_shards: int, shard_index: int) -> List[str]:
+    """
+    Selects the recordings that belong to a shard.
+
+    The assignment only depends on the path of each recording, so every worker gets the same shards regardless of the order of the manifest
+    and adding recordings to the manifest does not move the other recordings to different shards. Pass the relative paths from the manifest,
+    so that the assignment does not depend on where the shared filesystem is mounted.
+
+    :param recordings: paths of all recordings.
+    :param num_shards: the total number of shards, i.e., workers or nodes.
+    :param shard_index: the index of the shard to select, between 0 and `num_shards - 1`.
+
+    :return: A sorted list with the paths of the recordings in the shard, without duplicates.
+    """
+    assert 0 <= shard_index < num_shards, f"shard_index has to be between 0 and {num_shards - 1}, instead it was {shard_index}"
+
+    def shard_of(recording: str) -> int:
+        return int(hashlib.sha1(recording.encode()).hexdigest(), 16) % num_shards
+
+    return sorted(set(recording for recording in recordings if shard_of(recording) == shard_index))
+
+
+def hash_file(path: Union[str, Path], chunk_size: int = 2**20) -> str:
+    """
+    Computes the SHA-256 hash of a file's content.
+
+    :param path: path of the file.
+    :param chunk_size: number of bytes that are read at once (optional).
+
+    :return: The hex digest of the hash.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _describe_callable(function: Callable) -> Any:
+    if isinstance(function, partial):
+        return {"function": _describe_callable(function.func), "args": function.args, "keywords": function.keywords}
+
+    # callable objects are identified by their class
+    qualified_function = function if hasattr(function, "__qualname__") else type(function)
+    qualname = qualified_function.__qualname__
+
+    # lambdas and local functions all share names like "<lambda>", so they can't be told apart in the hash
+    assert "<" not in qualname, f"transforms and readers have to be defined at module level, instead got '{qualname}'"
+
+    return f"{qualified_function.__module__}.{qualname}"
+
+
+def _toolbox_version() -> str:
+    try:
+        return metadata.version("motion-learning-toolbox")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def hash_config(transform: Callable, config: Dict[str, Any], reader: Callable = pd.read_csv, version: Optional[str] = None) -> str:
+    """
+    Computes a hash that identifies a transform, its configuration, the reader that loads the recordings and the installed version of the toolbox.
+
+    Only the names of the transform and the reader are hashed, not their code. If the code of a transform changes, bump `version` or change the config.
+
+    :param transform: the function that is applied to each recording.
+    :param config: the keyword arguments that are passed to `transform`; has to be JSON serializable.
+    :param reader: the function that loads each recording (default is `pd.read_csv`); use `functools.partial` to pass options, so that they are part of the hash.
+    :param version: the version of the transform (optional).
+
+    :return: The hex digest of the hash.
+    """
+    identifier = json.dumps(
+        {
+            "transform": _describe_callable(transform),
+            "config": config,
+            "reader": _describe_callable(reader),
+            "version": version,
+            "toolbox_version": _toolbox_version(),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(identifier.encode()).hexdigest()
+
+
+def _load_checkpoints(checkpoint_dir: Path) -> Dict[str, Dict[str, Any]]:
+    # checkpoints of all shards are considered, so that changing the number of shards does not invalidate finished work
+    checkpoints = {}
+    for checkpoint_path in checkpoint_dir.glob("shard-*.jsonl"):
+        for line in checkpoint_path.read_text().splitlines():
+            # the last line might be incomplete if a worker was killed while writing it
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry["recording"] not in checkpoints or checkpoints[entry["recording"]]["finished_at"] <= entry["finished_at"]:
+                checkpoints[entry["recording"]] = entry
+    return checkpoints
+
+
+def process_corpus(
+    manifest_path: Union[str, Path],
+    output_dir: Union[str, Path],
+    transform: Callable[..., pd.DataFrame],
+    config: Optional[Dict[str, Any]] = None,
+    num_shards: int = 1,
+    shard_index: int = 0,
+    reader: Callable[[str], pd.DataFrame] = pd.read_csv,
+    version: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Applies a transform to all recordings of one shard of a corpus and writes the results as CSV files.
+
+    Each worker or node processes its own shard, so `process_corpus` can be run in parallel on several machines against a shared filesystem.
+    Finished recordings are checkpointed in `output_dir`; recordings whose content, transform, config, reader, `version` and toolbox version did not
+    change since they were last processed successfully are skipped, which makes interrupted runs resumable. As the code of the transform is
+    not checked, bump `version` whenever it changes. Failing recordings are reported and do not stop the shard.
+
+    :param manifest_path: path of the manifest listing the recordings, see `read_manifest`.
+    :param output_dir: directory for the outputs, checkpoints and reports; the outputs are stored under the same relative paths as the recordings, with ".csv" appended; must not be the directory of the manifest.
+    :param transform: function that is called as `transform(data, **config)` for each recording and returns the processed DataFrame.
+    :param config: keyword arguments for `transform` (optional); has to be JSON serializable.
+    :param num_shards: the total number of shards (default is 1).
+    :param shard_index: the index of the shard that is processed (default is 0).
+    :param reader: function that loads a recording into a DataFrame (default is `pd.read_csv`); pass options with `functools.partial`.
+    :param version: the version of the transform (optional); changing it forces all recordings to be processed again.
+
+    :return: A report of the shard with the number of processed, skipped and failed recordings, the throughput and the errors.
+    """
+    config = config or {}
+    manifest_dir = Path(manifest_path).parent
+    output_dir = Path(output_dir)
+    assert output_dir.resolve() != manifest_dir.resolve(), "output_dir must not be the directory of the manifest, otherwise outputs could overwrite the recordings"
+    shard_name = f"shard-{shard_index:05d}-of-{num_shards:05d}"
+
+    checkpoint_path = output_dir / CHECKPOINT_DIRECTORY / f"{shard_name}.jsonl"
+    report_path = output_dir / REPORT_DIRECTORY / f"{shard_name}.json"
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+
+    recordings = shard_recordings(read_manifest(manifest_path), num_shards, shard_index)
+    checkpoints = _load_checkpoints(checkpoint_path.parent)
+    config_hash = hash_config(transform, config, reader, version)
+
+    report = {"shard": shard_name, "recordings": len(recordings), "processed": 0, "skipped": 0, "failed": 0, "frames": 0, "seconds": 0.0, "errors": []}
+    start_time = time.perf_counter()
+
+    with open(checkpoint_path, "a") as checkpoint_file:
+        for recording in recordings:
+            entry = {"recording": recording, "config_hash": config_hash}
+
+            try:
+                if Path(recording).is_absolute() or ".." in Path(recording).parts:
+                    raise ValueError("recordings have to be given relative to the directory of the manifest")
+
+                output_path = output_dir / f"{recording}.csv"
+                entry["input_hash"] = hash_file(manifest_dir / recording)
+
+                previous_entry = checkpoints.get(recording, {})
+                if (
+                    previous_entry.get("status") == "done"
+                    and previous_entry.get("input_hash") == entry["input_hash"]
+                    and previous_entry.get("config_hash") == config_hash
+                    and output_path.exists()
+                ):
+                    report["skipped"] += 1
+                    continue
+
+                result = transform(reader(str(manifest_dir / recording)), **config)
+
+                # write to a temporary file first, so that an interrupted worker never leaves a truncated output behind
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                temporary_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+                try:
+                    result.to_csv(temporary_path, index=not isinstance(result.index, pd.RangeIndex))
+                    os.replace(temporary_path, output_path)
+                finally:
+                    temporary_path.unlink(missing_ok=True)
+
+                entry.update(status="done", frames=len(result))
+                report["processed"] += 1
+                report["frames"] += len(result)
+            except Exception as e:
+                entry.update(status="failed", error=f"{type(e).__name__}: {e}")
+                report["failed"] += 1
+                report["errors"].append({"recording": recording, "error": entry["error"]})
+
+            entry["finished_at"] = time.time()
+            checkpoint_file.write(json.dumps(entry) + "\n")
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+    report["seconds"] = time.perf_counter() - start_time
+    report["recordings_per_second"] = report["processed"] / report["seconds"] if report["seconds"] > 0 else 0.0
+    report["frames_per_second"] = report["frames"] / report["seconds"] if report["seconds"] > 0 else 0.0
+
+    report_path.write_text(json.dumps(report, indent=2))
+
+    return report
+
+
+def process_corpus_locally(
+    manifest_path: Union[str, Path],
+    output_dir: Union[str, Path],
+    transform: Callable[..., pd.DataFrame],
+    config: Optional[Dict[str, Any]] = None,
+    num_shards: int = 1,
+    max_workers: Optional[int] = None,
+    reader: Callable[[str], pd.DataFrame] = pd.read_csv,
+    version: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Processes all shards of a corpus with a pool of local worker processes, see `process_corpus`.
+
+    :param manifest_path: path of the manifest listing the recordings, see `read_manifest`.
+    :param output_dir: directory for the outputs, checkpoints and reports.
+    :param transform: function that is called as `transform(data, **config)` for each recording; has to be picklable, i.e., defined at module level.
+    :param config: keyword arguments for `transform` (optional).
+    :param num_shards: the number of shards the corpus is split into (default is 1).
+    :param max_workers: the number of worker processes (default is the number of CPUs).
+    :param reader: function that loads a recording into a DataFrame (default is `pd.read_csv`).
+    :param version: the version of the transform (optional).
+
+    :return: The aggregated report of all shards, see `aggregate_reports`.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(process_corpus, manifest_path, output_dir, transform, config, num_shards, shard_index, reader, version) for shard_index in range(num_shards)]
+        for future in futures:
+            future.result()
+
+    return aggregate_reports(output_dir, num_shards)
+
+
+def aggregate_reports(output_dir: Union[str, Path], num_shards: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Combines the reports of all shards that were written to `output_dir`.
+
+    :param output_dir: the output directory that was passed to `process_corpus`.
+    :param num_shards: only combine the reports of runs with this number of shards (optional); by default, the number of shards of the most recently
+        written report is used, so that reports of earlier runs with a different number of shards are not counted twice.
+
+    :return: A report with the summed up counts of all shards, the overall throughput, the overall errors and the individual shard reports.
+        `seconds` is the summed up processing time of all shards, `wall_clock_seconds` that of the slowest shard, which is the duration of
+        the run if the shards are processed in parallel; the rates are computed from `wall_clock_seconds`.
+    """
+    report_dir = Path(output_dir) / REPORT_DIRECTORY
+
+    if num_shards is None:
+        report_paths = list(report_dir.glob("shard-*-of-*.json"))
+        if report_paths:
+            latest_report_path = max(report_paths, key=lambda path: path.stat().st_mtime)
+            num_shards = int(latest_report_path.stem.rsplit("-of-", 1)[1])
+
+    shard_reports = [json.loads(path.read_text()) for path in sorted(report_dir.glob(f"shard-*-of-{num_shards:05d}.json"))] if num_shards else []
+
+    report = {key: sum(shard_report[key] for shard_report in shard_reports) for key in ["recordings", "processed", "skipped", "failed", "frames"]}
+    report["seconds"] = sum(shard_report["seconds"] for shard_report in shard_reports)
+    report["wall_clock_seconds"] = max((shard_report["seconds"] for shard_report in shard_reports), default=0.0)
+    report["recordings_per_second"] = report["processed"] / report["wall_clock_seconds"] if report["wall_clock_seconds"] > 0 else 0.0
+    report["frames_per_second"] = report["frames"] / report["wall_clock_seconds"] if report["wall_clock_seconds"] > 0 else 0.0
+    report["errors"] = [error for shard_report in shard_reports for error in shard_report["errors"]]
+    report["shards"] = shard_reports
+
+    return report
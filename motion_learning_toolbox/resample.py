@@ -1,19 +1,48 @@
-from typing import List
+from typing import List, Optional, Union
 import numpy as np
 import pandas as pd
 from scipy.spatial.transform import Rotation
 from scipy.spatial.transform import Slerp
 
 
-def resample(data: pd.DataFrame, target_fps: float, joint_names: List[str]):
+def find_segments(original_index: np.ndarray, valid_frames: np.ndarray, max_gap_ms: float) -> np.ndarray:
+    """
+    Splits a recording into contiguous segments at tracking gaps.
+
+    :param original_index: timestamps of the frames in milliseconds.
+    :param valid_frames: boolean mask marking the frames that contain valid tracking data for all features.
+    :param max_gap_ms: the longest time span between two consecutive valid frames that is still considered contiguous.
+
+    :return: an array of shape (num_segments, 2) with the first and last timestamp of each segment in milliseconds.
+    """
+    valid_index = original_index[valid_frames]
+
+    if len(valid_index) == 0:
+        return np.empty((0, 2))
+
+    gaps = np.flatnonzero(np.diff(valid_index) > max_gap_ms)
+    segment_starts = valid_index[np.concatenate([[0], gaps + 1])]
+    segment_ends = valid_index[np.concatenate([gaps, [len(valid_index) - 1]])]
+
+    return np.column_stack([segment_starts, segment_ends])
+
+
+def resample(data: pd.DataFrame, target_fps: float, joint_names: List[str], max_gap: Optional[Union[str, pd.Timedelta]] = None):
     """
     Resamples a recording DataFrame to a target frames-per-second (FPS) rate.
 
+    By default, gaps in the tracking data are interpolated, no matter how long they are. If `max_gap` is set, the recording is instead split
+    wherever the time between two consecutive frames with valid data for all features is longer than `max_gap`, and only the contiguous
+    segments in between are resampled; no frames are generated for the gaps. The frames of all segments are taken from the same time grid,
+    so the result matches the default mode within each segment.
+
     :param data: A DataFrame containing the original tracking data; the DataFrame needs to have an index of type "timedelta64" (use `pd.to_timedelta` to convert integer indices).
     :param target_fps: The target frames-per-second (FPS) rate for resampling.
     :param joint_names: A list of joint names for which the data will be resampled.
+    :param max_gap: The longest time between two consecutive frames with valid data for all features that is still interpolated (optional); accepts everything `pd.to_timedelta` does, e.g. "500ms".
 
-    :return: A new DataFrame containing the resampled data with the specified target FPS.
+    :return: A new DataFrame containing the resampled data with the specified target FPS. If `max_gap` is set, a tuple of this DataFrame and an array of shape (num_segments, 2)
+        holding the start (inclusive) and stop (exclusive) row positions of each contiguous segment in the DataFrame.
     """
 
     assert data.index.inferred_type == "timedelta64", f"dataframe index has to be timedelta64, instead it was '{data.index.inferred_type}'"
@@ -30,23 +59,50 @@ def resample(data: pd.DataFrame, target_fps: float, joint_names: List[str]):
     mspf = 1000 / target_fps
 
     original_index = features.index.total_seconds() * 1000
-    target_index = np.arange(original_index.min(), original_index.max(), mspf)
+
+    if max_gap is None:
+        target_index = np.arange(original_index.min(), original_index.max(), mspf)
+    else:
+        max_gap_ms = pd.to_timedelta(max_gap).total_seconds() * 1000
+        segment_times = find_segments(original_index.to_numpy(), features.notna().all(axis=1).to_numpy(), max_gap_ms)
+
+        # select the frames of the time grid that fall into each segment; segments that are too short to contain any frame are dropped
+        first_frames = np.ceil((segment_times[:, 0] - original_index.min()) / mspf).astype(int)
+        stop_frames = np.ceil((segment_times[:, 1] - original_index.min()) / mspf).astype(int)
+        frame_counts = stop_frames - first_frames
+        first_frames, frame_counts = first_frames[frame_counts > 0], frame_counts[frame_counts > 0]
+
+        segment_stops = np.cumsum(frame_counts)
+        segments = np.column_stack([segment_stops - frame_counts, segment_stops])
+
+        frame_numbers = np.arange(segment_stops[-1] if len(segment_stops) else 0) + np.repeat(first_frames - segments[:, 0], frame_counts)
+        target_index = original_index.min() + frame_numbers * mspf
+
+        if len(target_index) == 0:
+            return pd.DataFrame(index=pd.to_timedelta(target_index, unit='ms'), columns=feature_columns, dtype=float), segments
 
     interpolated_features = pd.DataFrame(index=pd.to_timedelta(target_index, unit='ms'))
-    features.loc[:, position_columns] = features[position_columns].interpolate("time")
 
-    assert not any(features[position_columns].isna().any())
+    if max_gap is None:
+        features.loc[:, position_columns] = features[position_columns].interpolate("time")
+
+        assert not any(features[position_columns].isna().any())
 
     for pos_feature_name in position_columns:
-        column = features[pos_feature_name]
-        interpolated_features[pos_feature_name] = np.interp(x=target_index, xp=original_index, fp=column)
+        column = features[pos_feature_name].dropna()
+        dropped_na_original_index = column.index.total_seconds() * 1000
+        interpolated_features[pos_feature_name] = np.interp(x=target_index, xp=dropped_na_original_index, fp=column)
 
     for joint in joint_names:
         joint_orientation_features = [f"{joint}_rot_{c}" for c in "xyzw"]
+
         orientational_features = features[joint_orientation_features].dropna()
         rotations = Rotation.from_quat(orientational_features)
         dropped_na_original_index = orientational_features.index.total_seconds() * 1000
         slerp = Slerp(dropped_na_original_index, rotations)
         interpolated_features[joint_orientation_features] = slerp(target_index).as_quat()
 
-    return interpolated_features
+    if max_gap is None:
+        return interpolated_features
+    else:
+        return interpolated_features, segments
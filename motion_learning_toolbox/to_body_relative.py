@@ -1,22 +1,22 @@
-from typing import Dict, List
+from typing import Dict, List, Union
 import quaternionic
 import numpy as np
 import pandas as pd
 
-from .canonicalize_quaternions import canonicalize_quaternions
+from .canonicalize_quaternions import canonicalize_quaternion_array
 
 def quaternion_composition(quaternion_array1, quaternion_array2):
     w1, x1, y1, z1 = (
-        quaternion_array1[:, 0],
-        quaternion_array1[:, 1],
-        quaternion_array1[:, 2],
-        quaternion_array1[:, 3],
+        quaternion_array1[..., 0],
+        quaternion_array1[..., 1],
+        quaternion_array1[..., 2],
+        quaternion_array1[..., 3],
     )
     w2, x2, y2, z2 = (
-        quaternion_array2[:, 0],
-        quaternion_array2[:, 1],
-        quaternion_array2[:, 2],
-        quaternion_array2[:, 3],
+        quaternion_array2[..., 0],
+        quaternion_array2[..., 1],
+        quaternion_array2[..., 2],
+        quaternion_array2[..., 3],
     )
 
     w_composed = w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2
@@ -24,7 +24,7 @@ def quaternion_composition(quaternion_array1, quaternion_array2):
     y_composed = w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2
     z_composed = w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
 
-    composed_quaternions = quaternionic.array(np.column_stack((w_composed, x_composed, y_composed, z_composed))).normalized
+    composed_quaternions = quaternionic.array(np.stack((w_composed, x_composed, y_composed, z_composed), axis=-1)).normalized
     return composed_quaternions
 
 
@@ -32,20 +32,30 @@ def to_body_relative(
     frames: pd.DataFrame,
     target_joints: List[str],
     coordinate_system: Dict[str, str],
-    reference_joint="head",
+    reference_joint: Union[str, List[str]] = "head",
 ):
     """
     Transforms position and rotation data into a body-relative coordinate system.
 
+    Several reference joints can be passed at once, in which case all encodings are computed in a single pass: the target joints are
+    loaded only once and the results are written into one preallocated block. The returned DataFrame then has two column levels,
+    so that `result[reference_joint]` holds the same data as calling this function with only that `reference_joint`.
+
     :param frames: A DataFrame or Series containing position and/or rotation data.
     :param target_joints: A list of joints to be transformed.
     :param coordinate_system: A dictionary specifying the coordinate system for the transformation.
-    :param reference_joint: The reference joint used as the origin of the body-relative coordinate system (default is "head").
+    :param reference_joint: The reference joint used as the origin of the body-relative coordinate system (default is "head"), or a list of reference joints.
     """
-    reference_pos_columns = [f"{reference_joint}_pos_{xyz}" for xyz in "xyz"]
-    target_dtype = frames[reference_pos_columns[0]].to_numpy().dtype
-    target_dtype = target_dtype if np.issubdtype(target_dtype, np.floating) else "float32"
-    min_float32_dtype = "float32" if target_dtype == np.float16 else target_dtype
+    multiple_references = isinstance(reference_joint, (list, tuple))
+    reference_joints = list(reference_joint) if multiple_references else [reference_joint]
+
+    assert len(reference_joints) > 0, "at least one reference joint is required"
+    assert len(set(reference_joints)) == len(reference_joints), f"reference joints have to be unique, instead they were {reference_joints}"
+
+    reference_pos_columns = [f"{reference}_pos_{xyz}" for reference in reference_joints for xyz in "xyz"]
+    target_dtype = np.result_type(*frames[reference_pos_columns].dtypes)
+    target_dtype = target_dtype if np.issubdtype(target_dtype, np.floating) else np.dtype("float32")
+    min_float32_dtype = np.dtype("float32") if target_dtype == np.float16 else target_dtype
 
     FORWARD = "xyz".index(coordinate_system["forward"])
     RIGHT = "xyz".index(coordinate_system["right"])
@@ -57,54 +67,73 @@ def to_body_relative(
     UP_DIRECTION = np.identity(3, dtype=target_dtype)[UP]
 
     num_samples = len(frames)
+    num_references = len(reference_joints)
+    num_targets = len(target_joints)
 
-    ## parse rotations of the reference joint (the head)
-    reference_rotation_names = [f"{reference_joint}_rot_{c}" for c in "wxyz"]
-    reference_rotations = quaternionic.array(frames[reference_rotation_names], dtype=target_dtype).normalized.astype(min_float32_dtype)
+    ## parse positions and rotations of the reference joints (e.g., the head), shape: (samples, references, 3|4)
+    reference_positions = frames[reference_pos_columns].to_numpy().reshape(num_samples, num_references, 3)
+    reference_rotation_names = [f"{reference}_rot_{c}" for reference in reference_joints for c in "wxyz"]
+    reference_rotations = np.ascontiguousarray(frames[reference_rotation_names].to_numpy(dtype=target_dtype)).reshape(num_samples, num_references, 4)
+    reference_rotations = quaternionic.array(reference_rotations).normalized.astype(min_float32_dtype)
 
     ## retrieve projection of viewing direction of the reference joint on
     ## the horizontal plane by first applying the head rotation onto the
     ## forward vector and then zeroing out the UP axis
     horizontal_plane_projections = reference_rotations.rotate(FORWARD_DIRECTION)
 
-    horizontal_plane_projections[:, UP] = 0
+    horizontal_plane_projections[..., UP] = 0
 
-    rotations_around_up_axis = np.arccos((horizontal_plane_projections @ FORWARD_DIRECTION) / (np.linalg.norm(FORWARD_DIRECTION) * np.linalg.norm(horizontal_plane_projections, axis=1)))
+    rotations_around_up_axis = np.arccos((horizontal_plane_projections @ FORWARD_DIRECTION) / (np.linalg.norm(FORWARD_DIRECTION) * np.linalg.norm(horizontal_plane_projections, axis=-1)))
 
     ## compute correction rotation
     # find out into which direction the vectors have to be rotated
-    correction_rotation_directions = -np.sign(horizontal_plane_projections[:, RIGHT])
+    correction_rotation_directions = -np.sign(horizontal_plane_projections[..., RIGHT])
 
     # build euler angle rotation vector for rotation around UP axis
     # (usage of `.from_axis_angle` feels a bit hacky, but that's easier than building
     # a rotation matrix from scratch)
-    correction_rotations_raw = np.zeros((num_samples, 3), dtype=target_dtype)
-    correction_rotations_raw[:, UP] = correction_rotation_directions * rotations_around_up_axis
+    correction_rotations_raw = np.zeros((num_samples, num_references, 3), dtype=target_dtype)
+    correction_rotations_raw[..., UP] = correction_rotation_directions * rotations_around_up_axis
     correction_rotations = quaternionic.array.from_axis_angle(correction_rotations_raw).astype(min_float32_dtype)
 
-    ## apply correction positions and rotations
-    relative_positions_and_rotations = pd.DataFrame()
+    ## parse positions and rotations of the target joints once for all reference joints, shape: (samples, targets, 3|4)
+    target_positions = frames[[f"{joint_name}_pos_{c}" for joint_name in target_joints for c in "xyz"]].to_numpy().reshape(num_samples, num_targets, 3)
+    target_rotations = np.ascontiguousarray(frames[[f"{joint_name}_rot_{c}" for joint_name in target_joints for c in "wxyz"]].to_numpy(dtype=min_float32_dtype)).reshape(num_samples, num_targets, 4)
 
-    for joint_name in target_joints:  # => joint_name is either `right_hand` or `left_hand`
-        # apply rotations to position vector of `joint_name`
-        joint_position_names = [f"{joint_name}_pos_{c}" for c in "xyz"]
+    ## preallocate the output block: the positions and rotations of the target joints for
+    ## every reference joint, followed by the horizontal rotations of those reference joints
+    ## that are not already part of `target_joints`
+    separate_references = [idx for idx, reference in enumerate(reference_joints) if reference not in target_joints]
+    joints_width = num_references * num_targets * 7
+    relative_positions_and_rotations = np.empty((num_samples, joints_width + len(separate_references) * 4), dtype=min_float32_dtype)
+    relative_joints = relative_positions_and_rotations[:, :joints_width].reshape(num_samples, num_references, num_targets, 7)
+    relative_references = relative_positions_and_rotations[:, joints_width:].reshape(num_samples, len(separate_references), 4)
 
-        shifted_positions = frames[joint_position_names].values - frames[reference_pos_columns].values
+    ## apply correction positions and rotations
+    # apply rotations to position vectors of the target joints
+    shifted_positions = target_positions[:, None] - reference_positions[:, :, None]
+    np.einsum("irjk,irmk->irmj", correction_rotations.to_rotation_matrix, shifted_positions, out=relative_joints[..., :3], casting="unsafe")
 
-        shifted_and_rotated_positions = np.einsum("ijk,ik->ij", correction_rotations.to_rotation_matrix, shifted_positions)
-        relative_positions_and_rotations[joint_position_names] = shifted_and_rotated_positions
+    # rotate the world rotations of the target joints by the correction rotations
+    relative_joints[..., 3:] = quaternion_composition(correction_rotations.ndarray[:, :, None], target_rotations[:, None]).ndarray
 
-        # rotate the world rotation of `joint_name` by the correction rotation and save quaternion representations
-        joint_rotation_names = [f"{joint_name}_rot_{c}" for c in "wxyz"]
+    # add horizontal rotations of reference joints
+    horizontal_reference_rotations = (correction_rotations * reference_rotations).normalized.ndarray
+    relative_references[...] = horizontal_reference_rotations[:, separate_references]
+    for reference_idx, reference in enumerate(reference_joints):
+        if reference in target_joints:
+            relative_joints[:, reference_idx, target_joints.index(reference), 3:] = horizontal_reference_rotations[:, reference_idx]
 
-        sr_rotations = quaternionic.array(frames[joint_rotation_names]).astype(target_dtype)
-        br_rotations = quaternion_composition(correction_rotations.ndarray, sr_rotations.ndarray)
+    canonicalize_quaternion_array(relative_joints[..., 3:])
+    canonicalize_quaternion_array(relative_references)
 
-        relative_positions_and_rotations[joint_rotation_names] = br_rotations.normalized.astype(target_dtype).ndarray
+    joint_column_names = [f"{joint_name}_{kind}_{c}" for joint_name in target_joints for kind, components in [("pos", "xyz"), ("rot", "wxyz")] for c in components]
+    column_names = [(reference, column_name) for reference in reference_joints for column_name in joint_column_names]
+    column_names += [(reference_joints[idx], f"{reference_joints[idx]}_rot_{c}") for idx in separate_references for c in "wxyz"]
 
-    # add horizontal rotations of reference joint
-    relative_positions_and_rotations[reference_rotation_names] = (correction_rotations * reference_rotations).normalized.astype(target_dtype).ndarray
-    
-    relative_positions_and_rotations = canonicalize_quaternions(relative_positions_and_rotations, joint_names=[reference_joint, *target_joints])
+    if multiple_references:
+        columns = pd.MultiIndex.from_tuples(column_names)
+    else:
+        columns = pd.Index([column_name for _, column_name in column_names])
 
-    return relative_positions_and_rotations
+    return pd.DataFrame(relative_positions_and_rotations, columns=columns, copy=False)
@@ -27,3 +27,27 @@ def test_canonicalize_quaternions():
     # Assumption 3: Function should not alter unrelated columns
     unrelated_columns = [col for col in test_df.columns if all(joint not in col for joint in joint_names)]
     assert test_df[unrelated_columns].equals(canonical_df[unrelated_columns])
+
+
+def test_canonicalize_quaternions_edge_cases():
+    test_df = pd.DataFrame(
+        [
+            [0.0, -1.0, 0.0, 0.0],  # w == 0: sign is taken from x
+            [0.0, 0.0, 0.0, -2.0],  # w == x == y == 0: sign is taken from z
+            [-2.0, 0.0, 0.0, 0.0],
+            [np.nan, 1.0, 0.0, 0.0],
+            [1.0, np.nan, 0.0, 0.0],
+        ],
+        columns=[f"hmd_rot_{xyzw}" for xyzw in "wxyz"],
+    )
+
+    canonical_df = canonicalize_quaternions(test_df, ["hmd"])
+
+    expected = [
+        [0.0, 1.0, 0.0, 0.0],
+        [0.0, 0.0, 0.0, 1.0],
+        [1.0, 0.0, 0.0, 0.0],
+        [np.nan] * 4,
+        [np.nan] * 4,
+    ]
+    assert np.allclose(canonical_df.to_numpy(), expected, equal_nan=True)
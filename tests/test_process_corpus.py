@@ -0,0 +1,188 @@
+from functools import partial
+import importlib
+
+import pandas as pd
+import pytest
+
+from motion_learning_toolbox import aggregate_reports, process_corpus, process_corpus_locally, shard_recordings, to_body_relative
+
+
+def encode_body_relative(data: pd.DataFrame, reference_joint: str) -> pd.DataFrame:
+    return to_body_relative(data, ["left_hand", "right_hand"], {"forward": "z", "right": "x", "up": "y"}, reference_joint)
+
+
+class PartiallyWrittenResult(pd.DataFrame):
+    def to_csv(self, path, *args, **kwargs):
+        with open(path, "w") as file:
+            file.write("incomplete")
+        raise OSError("No space left on device")
+
+
+def encode_partially_written(data: pd.DataFrame) -> pd.DataFrame:
+    return PartiallyWrittenResult(data)
+
+
+class BodyRelativeEncoder:
+    def __call__(self, data: pd.DataFrame, reference_joint: str) -> pd.DataFrame:
+        return encode_body_relative(data, reference_joint)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    test_df = pd.read_csv("test_data.csv")
+    recordings = [f"user_{user}/session_{session}.csv" for user in range(3) for session in range(2)]
+
+    for recording in recordings:
+        (tmp_path / "corpus" / recording).parent.mkdir(parents=True, exist_ok=True)
+        test_df.to_csv(tmp_path / "corpus" / recording, index=False)
+
+    manifest_path = tmp_path / "corpus" / "manifest.txt"
+    manifest_path.write_text("\n".join(["# recordings", *recordings]))
+
+    return manifest_path, recordings
+
+
+@pytest.mark.parametrize("num_shards", [1, 3, 8])
+def test_shard_recordings(num_shards: int):
+    recordings = [f"user_{idx}/session.csv" for idx in range(100)]
+
+    shards = [shard_recordings(recordings, num_shards, shard_index) for shard_index in range(num_shards)]
+
+    # shards are disjoint, cover all recordings and don't depend on the order of the recordings
+    assert sorted(recording for shard in shards for recording in shard) == sorted(recordings)
+    assert shards == [shard_recordings(recordings[::-1], num_shards, shard_index) for shard_index in range(num_shards)]
+
+    # duplicates are only processed once
+    assert shards == [shard_recordings(recordings + recordings[:10], num_shards, shard_index) for shard_index in range(num_shards)]
+
+
+def test_process_corpus(corpus, tmp_path):
+    manifest_path, recordings = corpus
+    output_dir = tmp_path / "output"
+    num_shards = 2
+
+    reports = [process_corpus(manifest_path, output_dir, encode_body_relative, {"reference_joint": "hmd"}, num_shards, shard_index) for shard_index in range(num_shards)]
+
+    assert sum(report["processed"] for report in reports) == len(recordings)
+    assert all(report["failed"] == 0 for report in reports)
+
+    for recording in recordings:
+        pd.testing.assert_frame_equal(pd.read_csv(output_dir / f"{recording}.csv"), encode_body_relative(pd.read_csv(manifest_path.parent / recording), "hmd"), check_dtype=False)
+
+    # a second run skips all recordings that are up to date
+    (manifest_path.parent / recordings[0]).write_text((manifest_path.parent / recordings[0]).read_text() + "\n")
+    reports = [process_corpus(manifest_path, output_dir, encode_body_relative, {"reference_joint": "hmd"}, num_shards, shard_index) for shard_index in range(num_shards)]
+
+    assert sum(report["skipped"] for report in reports) == len(recordings) - 1
+    assert sum(report["processed"] for report in reports) == 1
+
+    # changing the config invalidates all outputs
+    report = process_corpus(manifest_path, output_dir, encode_body_relative, {"reference_joint": "left_hand"})
+    assert report["processed"] == len(recordings)
+
+    # so does changing the reader or its options
+    report = process_corpus(manifest_path, output_dir, encode_body_relative, {"reference_joint": "left_hand"}, reader=partial(pd.read_csv, sep=","))
+    assert report["processed"] == len(recordings)
+
+    report = process_corpus(manifest_path, output_dir, encode_body_relative, {"reference_joint": "left_hand"}, reader=partial(pd.read_csv, sep=","))
+    assert report["skipped"] == len(recordings)
+
+    # and bumping the version of the transform
+    report = process_corpus(manifest_path, output_dir, encode_body_relative, {"reference_joint": "left_hand"}, reader=partial(pd.read_csv, sep=","), version="2")
+    assert report["processed"] == len(recordings)
+
+
+def test_process_corpus_toolbox_upgrade(corpus, tmp_path, monkeypatch):
+    manifest_path, recordings = corpus
+    process_corpus_module = importlib.import_module("motion_learning_toolbox.process_corpus")
+
+    monkeypatch.setattr(process_corpus_module, "_toolbox_version", lambda: "1.0.0")
+    assert process_corpus(manifest_path, tmp_path / "output", encode_body_relative, {"reference_joint": "hmd"})["processed"] == len(recordings)
+
+    # outputs of an older version of the toolbox are not up to date anymore
+    monkeypatch.setattr(process_corpus_module, "_toolbox_version", lambda: "1.1.0")
+    assert process_corpus(manifest_path, tmp_path / "output", encode_body_relative, {"reference_joint": "hmd"})["processed"] == len(recordings)
+
+
+def test_process_corpus_errors(corpus, tmp_path):
+    manifest_path, recordings = corpus
+    output_dir = tmp_path / "output"
+
+    (manifest_path.parent / recordings[0]).write_text("timestamp\n0\n")
+
+    report = process_corpus_locally(manifest_path, output_dir, encode_body_relative, {"reference_joint": "hmd"}, num_shards=3, max_workers=2)
+
+    assert report["processed"] == len(recordings) - 1
+    assert report["failed"] == 1
+    assert report["errors"][0]["recording"] == recordings[0]
+    assert len(report["shards"]) == 3
+    assert report["frames"] == sum(shard_report["frames"] for shard_report in report["shards"]) > 0
+    assert report["seconds"] == pytest.approx(sum(shard_report["seconds"] for shard_report in report["shards"]))
+    assert report["wall_clock_seconds"] == max(shard_report["seconds"] for shard_report in report["shards"])
+    assert report["recordings_per_second"] == pytest.approx(report["processed"] / report["wall_clock_seconds"])
+    assert report["frames_per_second"] == pytest.approx(report["frames"] / report["wall_clock_seconds"])
+    assert report == aggregate_reports(output_dir, num_shards=3)
+
+    # reports of earlier runs with a different number of shards are ignored
+    process_corpus(manifest_path, output_dir, encode_body_relative, {"reference_joint": "hmd"}, num_shards=1, shard_index=0)
+    assert len(aggregate_reports(output_dir)["shards"]) == 1
+    assert aggregate_reports(output_dir)["recordings"] == len(recordings)
+
+    # the failed recording is retried on the next run
+    pd.read_csv("test_data.csv").to_csv(manifest_path.parent / recordings[0], index=False)
+    report = process_corpus_locally(manifest_path, output_dir, encode_body_relative, {"reference_joint": "hmd"}, num_shards=3, max_workers=2)
+
+    assert report["processed"] == 1
+    assert report["skipped"] == len(recordings) - 1
+    assert report["failed"] == 0
+
+
+def test_process_corpus_output_paths(corpus, tmp_path):
+    manifest_path, recordings = corpus
+
+    with pytest.raises(AssertionError):
+        process_corpus(manifest_path, manifest_path.parent, encode_body_relative, {"reference_joint": "hmd"})
+
+    # recordings that only differ in their suffix get separate outputs; duplicated lines are ignored
+    recording = recordings[0].replace(".csv", ".txt")
+    (manifest_path.parent / recording).write_text((manifest_path.parent / recordings[0]).read_text())
+    manifest_path.write_text("\n".join([*recordings, recording, recordings[0]]))
+
+    report = process_corpus(manifest_path, tmp_path / "output", encode_body_relative, {"reference_joint": "hmd"})
+
+    assert report["recordings"] == report["processed"] == len(recordings) + 1
+    assert (tmp_path / "output" / f"{recordings[0]}.csv").exists()
+    assert (tmp_path / "output" / f"{recording}.csv").exists()
+
+
+@pytest.mark.parametrize("transform", [BodyRelativeEncoder(), partial(BodyRelativeEncoder(), reference_joint="hmd")])
+def test_process_corpus_callable_objects(corpus, tmp_path, transform):
+    manifest_path, recordings = corpus
+    config = {} if isinstance(transform, partial) else {"reference_joint": "hmd"}
+
+    report = process_corpus(manifest_path, tmp_path / "output", transform, config)
+
+    assert report["processed"] == len(recordings)
+    assert report["failed"] == 0
+
+
+def test_process_corpus_rejects_lambdas_and_local_functions(corpus, tmp_path):
+    manifest_path, _ = corpus
+
+    def local_transform(data: pd.DataFrame) -> pd.DataFrame:
+        return data
+
+    for transform in [lambda data: data, local_transform]:
+        with pytest.raises(AssertionError, match="module level"):
+            process_corpus(manifest_path, tmp_path / "output", transform)
+
+
+def test_process_corpus_removes_temporary_files(corpus, tmp_path):
+    manifest_path, recordings = corpus
+    output_dir = tmp_path / "output"
+
+    report = process_corpus(manifest_path, output_dir, encode_partially_written)
+
+    assert report["failed"] == len(recordings)
+    assert "OSError" in report["errors"][0]["error"]
+    assert not [path for path in output_dir.rglob("*") if path.is_file() and path.parent.name not in ["_checkpoints", "_reports"]]
@@ -17,3 +17,36 @@ def test_resample():
 
         # Assertions for resampled_data
         assert len(resampled_data) == np.ceil(test_df.index[-1].total_seconds() * target_fps)
+
+
+def test_resample_with_gaps():
+    test_df = pd.read_csv("test_data.csv")
+    test_df.index = pd.to_timedelta(test_df.timestamp, unit="ms")
+    joint_names = ["hmd", "left_hand", "right_hand"]
+    target_fps = 60
+
+    # without any gaps longer than `max_gap`, the result should be the same as the default mode
+    resampled_data = resample(test_df, target_fps, joint_names)
+    segmented_data, segments = resample(test_df, target_fps, joint_names, max_gap="1s")
+
+    pd.testing.assert_frame_equal(resampled_data, segmented_data)
+    assert segments.tolist() == [[0, len(resampled_data)]]
+
+    # simulate a tracking loss
+    gap_df = test_df.copy()
+    gap_df.iloc[30:60, 1:] = np.nan
+
+    segmented_data, segments = resample(gap_df, target_fps, joint_names, max_gap="200ms")
+
+    assert len(segments) == 2
+    assert segments[0, 0] == 0 and segments[-1, 1] == len(segmented_data)
+    assert segments[0, 1] == segments[1, 0]
+    assert not segmented_data.isna().any().any()
+
+    # no frames should be generated for the gap
+    gap_start, gap_end = test_df.index[29], test_df.index[60]
+    assert not ((segmented_data.index > gap_start) & (segmented_data.index < gap_end)).any()
+
+    # frames within the segments should match the default mode
+    first_segment = segmented_data.iloc[segments[0, 0] : segments[0, 1]]
+    pd.testing.assert_frame_equal(first_segment, resampled_data.loc[first_segment.index])
@@ -171,3 +171,30 @@ def test_br_rotation_of_rotations_and_positions():
         ],
         [[*expected_left_hand_position, *expected_right_hand_position]],
     )
+
+
+def test_to_body_relative_multiple_reference_joints():
+    test_df = pd.read_csv("test_data.csv")
+    test_df.index = pd.to_timedelta(test_df.timestamp, unit="ms")
+
+    target_joints = ["left_hand", "right_hand"]
+    coordinate_system = {"forward": "z", "right": "x", "up": "y"}
+    reference_joints = ["hmd", "left_hand", "right_hand"]
+
+    transformed_data = to_body_relative(test_df, target_joints, coordinate_system, reference_joints)
+
+    assert len(transformed_data) == len(test_df)
+    assert list(transformed_data.columns.unique(level=0)) == reference_joints
+
+    # each encoding should match the one computed for the single reference joint
+    for reference_joint in reference_joints:
+        single_reference_data = to_body_relative(test_df, target_joints, coordinate_system, reference_joint)
+        pd.testing.assert_frame_equal(transformed_data[reference_joint], single_reference_data)
+
+
+@pytest.mark.parametrize("reference_joints", [[], ["hmd", "hmd"]])
+def test_to_body_relative_invalid_reference_joints(reference_joints):
+    test_df = pd.read_csv("test_data.csv")
+
+    with pytest.raises(AssertionError):
+        to_body_relative(test_df, ["left_hand", "right_hand"], {"forward": "z", "right": "x", "up": "y"}, reference_joints)